@@ -0,0 +1,410 @@
+"""
+This script benchmarks the Python side of the OCR test harness over the test cases, so that performance regressions
+are noticed and optimizations can be measured. To run the script, cd into this directory, create a virtual environment,
+and install the requirements. Then, run the script with the following command:
+
+python benchmark.py [testcase ...] [--save] [--baseline <commit>] [--threshold <fraction>]
+
+If no test cases are given, all test cases with a video are benchmarked. The following are measured:
+- video_server: frame latency and frames/sec for sequential and random access, and bytes per frame on the wire
+- OCRResults: load time and memory of test-results.yaml
+- run.py: render time per frame of the bounds and output modes, without opening any windows
+- digit classifier: inference throughput for single digits and for large batches
+
+Results are stored as JSON baselines in test-output/benchmarks/<machine>.json, keyed by commit. Runs on a working tree
+with uncommitted changes are keyed as <commit>-dirty, and are only saved with --allow-dirty. Each run is compared
+against the baseline of the given commit, or else of HEAD, or else the most recently saved baseline for the machine,
+and the script exits with a nonzero status if any metric regresses by more than the threshold, or if a metric in the
+baseline is missing from a benchmarked test case.
+"""
+
+import cv2, yaml, argparse, os, sys, time, json, random, socket, subprocess, tracemalloc
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from find_video import find_video_file
+from ocr_results import OCRResults
+from video_server import app
+from run import load_calibration, draw_bounds, draw_ocr_results, render_state_machine
+
+TEST_CASE_DIRECTORY = os.path.join(os.path.dirname(__file__), "../test-cases")
+OUTPUT_DIRECTORY = os.path.join(os.path.dirname(__file__), "../test-output")
+BENCHMARK_DIRECTORY = os.path.join(OUTPUT_DIRECTORY, "benchmarks")
+
+# Suffix of the commit key for runs on a working tree with uncommitted changes
+DIRTY_SUFFIX = "-dirty"
+
+# Fraction by which a metric may get worse than the baseline before it counts as a regression
+DEFAULT_THRESHOLD = 0.1
+
+# Metrics where a larger value is better. All other metrics are times, sizes or memory, where smaller is better.
+HIGHER_IS_BETTER = ("_fps", "_per_sec")
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith(HIGHER_IS_BETTER)
+
+def timed(function, repeat: int) -> List[float]:
+    """
+    Calls the function repeat times and returns the duration of each call in seconds.
+    """
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(i)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def benchmark_video_server(testcase: str, num_frames: int) -> Dict[str, float]:
+    """
+    Requests frames from the video server through the Flask test client, which exercises the same route handlers as
+    the TypeScript TestVideoSource without the cost of the network stack.
+    """
+
+    client = app.test_client()
+    response = client.post(f"/set/{testcase}")
+    if response.status_code != 200:
+        raise Exception(f"Could not set test case {testcase}: {response.get_json()}")
+
+    total_frames = client.get("/info").get_json()["frames"]
+    num_frames = min(num_frames, total_frames)
+    sizes = []
+
+    def fetch(frame: int):
+        response = client.get(f"/frame/{frame}")
+        if response.status_code != 200:
+            raise Exception(f"Could not fetch frame {frame} of {testcase}: {response.get_json()}")
+        sizes.append(len(response.data))
+
+    sequential = timed(fetch, num_frames)
+
+    random_frames = random.Random(0).sample(range(total_frames), num_frames)
+    random_access = timed(lambda i: fetch(random_frames[i]), num_frames)
+
+    return {
+        "video_server.sequential_latency_ms": 1000 * float(np.mean(sequential)),
+        "video_server.sequential_fps": num_frames / sum(sequential),
+        "video_server.random_latency_ms": 1000 * float(np.mean(random_access)),
+        "video_server.random_fps": num_frames / sum(random_access),
+        "video_server.bytes_per_frame": float(np.mean(sizes)),
+    }
+
+def load_ocr_results(results_path: str) -> OCRResults:
+    with open(results_path) as results_file:
+        return OCRResults(yaml.safe_load(results_file))
+
+def benchmark_ocr_results(results_path: str) -> Dict[str, float]:
+    """
+    Measures the time to load test-results.yaml into OCRResults, and separately the memory, since tracemalloc
+    slows down the load considerably.
+    """
+
+    start = time.perf_counter()
+    load_ocr_results(results_path)
+    load_time = time.perf_counter() - start
+
+    # Keep a reference to the results, so that the retained memory is still allocated when it is measured
+    tracemalloc.start()
+    ocr_results = load_ocr_results(results_path)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ocr_results
+
+    return {
+        "ocr_results.load_time_ms": 1000 * load_time,
+        "ocr_results.retained_mb": retained / 2**20,
+        "ocr_results.peak_mb": peak / 2**20,
+    }
+
+def benchmark_render(testcase: str, num_frames: int, ocr_results: Optional[OCRResults]) -> Dict[str, float]:
+    """
+    Measures the work run.py does for each frame in the bounds and output modes, without displaying anything.
+    Frames are decoded up front so that decoding is not included. The bounds mode reloads the calibration on every
+    frame, so that reload is timed along with the drawing.
+    """
+
+    _, calibration_plus = load_calibration(testcase)
+
+    video = cv2.VideoCapture(find_video_file(f"{TEST_CASE_DIRECTORY}/{testcase}"))
+    frames = []
+    while len(frames) < num_frames:
+        ret, frame = video.read()
+        if not ret:
+            break
+        frames.append(frame)
+    video.release()
+
+    results = {}
+
+    def render_bounds(i: int):
+        draw_bounds(frames[i].copy(), *load_calibration(testcase))
+
+    bounds = timed(render_bounds, len(frames))
+    results["render.bounds_ms_per_frame"] = 1000 * float(np.mean(bounds))
+
+    if ocr_results:
+        def render_output(i: int):
+            draw_ocr_results(frames[i].copy(), i, ocr_results, calibration_plus)
+            render_state_machine(i, ocr_results)
+
+        output = timed(render_output, len(frames))
+        results["render.output_ms_per_frame"] = 1000 * float(np.mean(output))
+
+    return results
+
+def benchmark_classifier(batch_size: int = 8192, num_batches: int = 4, num_single: int = 100) -> Dict[str, float]:
+    """
+    Measures the throughput of the digit classifier for one digit at a time, like NumberOCRBox.predictDigit, and for
+    large batches, like digit_ocr.py.
+    """
+    from digit_ocr import load_classifier, classify
+
+    model = load_classifier()
+    digits = np.random.default_rng(0).random((batch_size, 14, 14), dtype=np.float32)
+
+    # Warm up, so that graph tracing is not included
+    classify(model, digits[:1])
+    classify(model, digits)
+
+    single = timed(lambda i: classify(model, digits[i:i + 1]), num_single)
+    batched = timed(lambda i: classify(model, digits, batch_size), num_batches)
+
+    return {
+        "classifier.single_digits_per_sec": num_single / sum(single),
+        "classifier.batch_digits_per_sec": batch_size * num_batches / sum(batched),
+    }
+
+def benchmark_testcase(testcase: str, num_frames: int) -> Dict[str, float]:
+    results = benchmark_video_server(testcase, num_frames)
+
+    ocr_results = None
+    results_path = f"{OUTPUT_DIRECTORY}/{testcase}/test-results.yaml"
+    if os.path.exists(results_path):
+        results.update(benchmark_ocr_results(results_path))
+        ocr_results = load_ocr_results(results_path)
+
+    if os.path.exists(f"{OUTPUT_DIRECTORY}/{testcase}/calibration-plus.yaml"):
+        results.update(benchmark_render(testcase, num_frames, ocr_results))
+
+    return results
+
+def all_testcases() -> List[str]:
+    """
+    Returns all test cases that have a video.
+    """
+
+    testcases = []
+    for testcase in sorted(os.listdir(TEST_CASE_DIRECTORY)):
+        if testcase.startswith("."):
+            continue
+        try:
+            find_video_file(f"{TEST_CASE_DIRECTORY}/{testcase}")
+        except FileNotFoundError:
+            continue
+        testcases.append(testcase)
+    return testcases
+
+def git(*args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+def current_commit() -> str:
+    """
+    Returns the short hash of HEAD, with a "-dirty" suffix if the working tree has changes. The saved baselines are
+    excluded from the check, so that saving a baseline does not make the tree dirty.
+    """
+
+    benchmarks = os.path.relpath(BENCHMARK_DIRECTORY, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = git("rev-parse", "--short", "HEAD")
+        changes = git("status", "--porcelain", "--", ":/", f":(exclude){benchmarks}")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}{DIRTY_SUFFIX}" if changes else commit
+
+def baseline_path(machine: str) -> str:
+    return f"{BENCHMARK_DIRECTORY}/{machine}.json"
+
+def load_baselines(machine: str) -> Dict[str, Dict]:
+    """
+    Returns all saved baselines for the machine, keyed by commit.
+    """
+
+    path = baseline_path(machine)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def save_baseline(machine: str, commit: str, metrics: Dict[str, float]):
+    baselines = load_baselines(machine)
+    baselines[commit] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "metrics": metrics,
+    }
+
+    os.makedirs(BENCHMARK_DIRECTORY, exist_ok=True)
+    with open(baseline_path(machine), "w") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+    print(f"Saved baseline for {machine} at commit {commit}")
+
+def find_baseline(machine: str, commit: str, baseline_commit: Optional[str]) -> Optional[Dict]:
+    """
+    Returns the baseline of the requested commit. By default, returns the baseline of the current commit without
+    uncommitted changes, so that changes to the working tree are measured against HEAD. If HEAD has no baseline,
+    returns the most recently saved baseline, which may be one saved with --allow-dirty.
+    """
+
+    baselines = load_baselines(machine)
+    if baseline_commit:
+        if baseline_commit not in baselines:
+            raise ValueError(f"No baseline for commit {baseline_commit} on {machine}")
+        return {"commit": baseline_commit, **baselines[baseline_commit]}
+
+    head = commit.removesuffix(DIRTY_SUFFIX)
+    if head in baselines:
+        return {"commit": head, **baselines[head]}
+
+    candidates = [(entry["timestamp"], key) for key, entry in baselines.items()]
+    if not candidates:
+        return None
+    _, key = max(candidates)
+    return {"commit": key, **baselines[key]}
+
+def is_benchmarked(metric: str, testcases: List[str], classifier: bool) -> bool:
+    """
+    Returns whether the metric belongs to a test case, or to the classifier, that was benchmarked in this run.
+    """
+    testcase, _, name = metric.rpartition("/")
+    if testcase:
+        return testcase in testcases
+    return classifier or not name.startswith("classifier.")
+
+def compare(metrics: Dict[str, float], baseline: Dict[str, float], thresholds: Dict[str, float],
+            default_threshold: float, testcases: List[str], classifier: bool) -> List[str]:
+    """
+    Prints each metric against the baseline and returns the names of the metrics that regressed by more than their
+    threshold. A threshold is looked up by the full metric name, then by the name without the test case, e.g.
+    "video_server.random_fps", then by its group, e.g. "video_server".
+
+    A baseline metric that is missing from a benchmarked test case, e.g. render.output_ms_per_frame when
+    test-results.yaml is gone, counts as a regression. Baseline metrics of test cases that were not benchmarked in
+    this run, or of the classifier with --no-classifier, are only reported as skipped.
+    """
+
+    regressions = []
+    for metric in sorted(set(baseline) - set(metrics)):
+        if is_benchmarked(metric, testcases, classifier):
+            print(f"{metric:<55} {'missing':>12} {baseline[metric]:>12.3f}          REGRESSION")
+            regressions.append(metric)
+        else:
+            print(f"{metric:<55} {'skipped':>12} {baseline[metric]:>12.3f}")
+
+    for metric in sorted(metrics):
+        value = metrics[metric]
+        if metric not in baseline or baseline[metric] == 0:
+            print(f"{metric:<55} {value:>12.3f}")
+            continue
+
+        change = (value - baseline[metric]) / abs(baseline[metric])
+        worse = -change if higher_is_better(metric) else change
+        name = metric.split("/")[-1]
+        group = name.split(".")[0]
+        threshold = thresholds.get(metric, thresholds.get(name, thresholds.get(group, default_threshold)))
+
+        status = ""
+        if worse > threshold:
+            status = "REGRESSION"
+            regressions.append(metric)
+        elif worse < -threshold:
+            status = "improved"
+
+        print(f"{metric:<55} {value:>12.3f} {baseline[metric]:>12.3f} {change:>+8.1%} {status}")
+
+    return regressions
+
+def parse_threshold(value: str) -> Tuple[str, float]:
+    """
+    Parses a --metric-threshold argument of the form <metric>=<fraction>.
+    """
+    metric, _, threshold = value.partition("=")
+    try:
+        if metric:
+            return metric, float(threshold)
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"Expected <metric>=<fraction>, got {value}")
+
+def positive_int(value: str) -> int:
+    try:
+        if int(value) >= 1:
+            return int(value)
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"Expected a positive integer, got {value}")
+
+def run(testcases: List[str], num_frames: int, classifier: bool) -> Dict[str, float]:
+    metrics = {}
+    for testcase in testcases:
+        print(f"Benchmarking {testcase}")
+        for metric, value in benchmark_testcase(testcase, num_frames).items():
+            metrics[f"{testcase}/{metric}"] = value
+
+    if classifier:
+        print("Benchmarking digit classifier")
+        metrics.update(benchmark_classifier())
+
+    return metrics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for the OCR test harness")
+    parser.add_argument("testcases", type=str, nargs="*", help="Names of the test cases. Defaults to all test cases")
+    parser.add_argument("--frames", type=positive_int, default=50, help="Number of frames to sample per test case")
+    parser.add_argument("--machine", type=str, default=socket.gethostname(), help="Name of the machine for the baseline")
+    parser.add_argument("--save", action="store_true", help="Save the results as the baseline of the current commit")
+    parser.add_argument("--allow-dirty", action="store_true",
+                        help="Allow --save with uncommitted changes, keyed as <commit>-dirty")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Commit to compare against. Defaults to HEAD, or else the latest saved commit")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Fraction by which a metric may get worse before it counts as a regression")
+    parser.add_argument("--metric-threshold", type=parse_threshold, action="append", default=[],
+                        help="Threshold for one metric or group, e.g. video_server=0.25. Can be given multiple times")
+    parser.add_argument("--no-classifier", action="store_true", help="Skip the digit classifier benchmark")
+    args = parser.parse_args()
+
+    commit = current_commit()
+    testcases = args.testcases or all_testcases()
+    classifier = not args.no_classifier
+
+    # Check the arguments before benchmarking, so that bad input fails before any work is done
+    unknown = [testcase for testcase in args.testcases if testcase not in all_testcases()]
+    if unknown:
+        parser.error(f"Unknown test cases or test cases without a video: {', '.join(unknown)}")
+
+    if args.save and commit.endswith(DIRTY_SUFFIX) and not args.allow_dirty:
+        parser.error("The working tree has uncommitted changes. Commit them, or pass --allow-dirty to save anyway")
+
+    try:
+        baseline = find_baseline(args.machine, commit, args.baseline)
+    except ValueError as e:
+        parser.error(str(e))
+
+    metrics = run(testcases, args.frames, classifier)
+
+    print()
+    if baseline:
+        print(f"Comparing {commit} against baseline {baseline['commit']} ({baseline['timestamp']}) on {args.machine}")
+        regressions = compare(metrics, baseline["metrics"], dict(args.metric_threshold), args.threshold,
+                              testcases, classifier)
+    else:
+        print(f"No baseline for {args.machine}")
+        regressions = compare(metrics, {}, {}, args.threshold, testcases, classifier)
+
+    if args.save:
+        save_baseline(args.machine, commit, metrics)
+
+    if regressions:
+        print(f"\n{len(regressions)} metrics regressed: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,369 @@
+"""
+This script scores the digit classifier against the ground truth in each test case's train.txt, without replaying
+the TypeScript pipeline. Every frame of the video is decoded once, the digit cells of the score and level boxes from
+calibration.yaml are cut out of all frames at once, and the cells are thresholded into 14x14 matrices exactly like
+NumberOCRBox.getDigitMatrix does. All matrices are then classified in large batches. To run the script, cd into this
+directory, create a virtual environment, and install the requirements. Then, run the script with the following command:
+
+python digit_ocr.py [testcase ...]
+
+If no test cases are given, all test cases with a video and the score and level rects in calibration.yaml are scored.
+Test cases are decoded in parallel. For each test case, the per-frame predictions are saved to
+test-output/<testcase>/digit-predictions.yaml, and a confusion matrix of the score digits against train.txt is printed.
+"""
+
+import cv2, yaml, argparse, os, time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from find_video import find_video_file
+
+TEST_CASE_DIRECTORY = os.path.join(os.path.dirname(__file__), "../test-cases")
+OUTPUT_DIRECTORY = os.path.join(os.path.dirname(__file__), "../test-output")
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "../digit-classifier/digit_classifier_model/model.json")
+
+# width and height for the normalized rect around one digit, as in number-ocr-box.ts
+NUMBER_PIXEL_SIZE = 14
+
+# Each digit must have a minimum confidence of this value for the OCR to be successful, as in ocr-frame.ts
+MINIMUM_CONFIDENCE = 0.7
+
+# Number of digits in each OCR box, as in ocr-frame.ts
+NUMBER_OCR_BOXES = {
+    "score": 6,
+    "level": 2,
+}
+
+# Number of frames decoded before their digit cells are reduced to matrices
+CHUNK_SIZE = 256
+
+def js_round(values: np.ndarray) -> np.ndarray:
+    """
+    Rounds like Javascript's Math.round, which rounds halves up instead of to the nearest even number.
+    """
+    return np.floor(values + 0.5).astype(np.int64)
+
+def digit_cell_bounds(rect: Dict, num_digits: int, offset: Optional[Dict] = None) -> Tuple[np.ndarray, ...]:
+    """
+    Returns the inclusive (top, left, bottom, right) pixel bounds of every cell of every digit in the OCR box, each
+    as an array of shape (num_digits, 14, 14). Mirrors the scalePointWithinRect calls in NumberOCRBox.getDigitMatrix.
+    """
+
+    if offset is None:
+        offset = {"top": 0, "left": 0, "bottom": 0, "right": 0}
+
+    # Bounding rect of each digit
+    digits = np.arange(num_digits)
+    digit_left = js_round(rect["left"] + digits / num_digits * (rect["right"] - rect["left"])) + offset["left"]
+    digit_right = js_round(rect["left"] + (digits + 1) / num_digits * (rect["right"] - rect["left"])) + offset["right"]
+    digit_top = np.full(num_digits, js_round(np.float64(rect["top"])) + offset["top"])
+    digit_bottom = np.full(num_digits, js_round(np.float64(rect["bottom"])) + offset["bottom"])
+
+    # Bounding rect of each cell within each digit
+    cells = np.arange(NUMBER_PIXEL_SIZE) / NUMBER_PIXEL_SIZE
+    next_cells = np.arange(1, NUMBER_PIXEL_SIZE + 1) / NUMBER_PIXEL_SIZE
+
+    def scale(value, low, high):
+        return js_round(low[:, None] + value[None, :] * (high - low)[:, None])
+
+    cell_top = scale(cells, digit_top, digit_bottom)[:, :, None]
+    cell_bottom = scale(next_cells, digit_top, digit_bottom)[:, :, None]
+    cell_left = scale(cells, digit_left, digit_right)[:, None, :]
+    cell_right = scale(next_cells, digit_left, digit_right)[:, None, :]
+
+    shape = (num_digits, NUMBER_PIXEL_SIZE, NUMBER_PIXEL_SIZE)
+    return tuple(np.broadcast_to(bound, shape) for bound in (cell_top, cell_left, cell_bottom, cell_right))
+
+class DigitMatrixExtractor:
+    """
+    Computes the 14x14 digit matrices of a NumberOCRBox for a whole batch of frames at once. Each cell is the
+    fraction of pixels in the cell whose RGB average is above the threshold. Pixels outside the frame count as
+    black, as in NumberOCRBox.getDigitMatrix.
+    """
+
+    def __init__(self, rect: Dict, num_digits: int, width: int, height: int, threshold: int = 100,
+                 offset: Optional[Dict] = None):
+        self.num_digits = num_digits
+        self.threshold = threshold
+
+        top, left, bottom, right = digit_cell_bounds(rect, num_digits, offset)
+        self.num_cells = ((bottom - top + 1) * (right - left + 1)).astype(np.float32)
+
+        # Only the part of the frame covered by the cells is thresholded
+        self.y0, self.y1 = max(int(top.min()), 0), min(int(bottom.max()), height - 1)
+        self.x0, self.x1 = max(int(left.min()), 0), min(int(right.max()), width - 1)
+
+        # Clip the cells to the crop. Cells entirely outside the crop end up empty and sum to zero.
+        top = np.clip(top - self.y0, 0, self.y1 - self.y0 + 1)
+        left = np.clip(left - self.x0, 0, self.x1 - self.x0 + 1)
+        bottom = np.maximum(np.clip(bottom - self.y0, -1, self.y1 - self.y0), top - 1)
+        right = np.maximum(np.clip(right - self.x0, -1, self.x1 - self.x0), left - 1)
+        self.top, self.left, self.bottom, self.right = top, left, bottom + 1, right + 1
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Returns the part of a single frame needed by this OCR box, thresholded into a binary mask.
+        """
+        region = frame[self.y0:self.y1 + 1, self.x0:self.x1 + 1]
+        # average > threshold  <=>  r + g + b > 3 * threshold
+        return region.sum(axis=2, dtype=np.uint16) > 3 * self.threshold
+
+    def extract(self, masks: np.ndarray) -> np.ndarray:
+        """
+        Given a stack of thresholded crops of shape (frames, h, w), returns the digit matrices of shape
+        (frames, num_digits, 14, 14).
+        """
+
+        # Integral image with a leading row and column of zeros, so that any rectangle sums in four lookups
+        integral = np.zeros((masks.shape[0], masks.shape[1] + 1, masks.shape[2] + 1), dtype=np.int32)
+        np.cumsum(np.cumsum(masks, axis=1, dtype=np.int32), axis=2, out=integral[:, 1:, 1:])
+
+        sums = (
+            integral[:, self.bottom, self.right]
+            - integral[:, self.top, self.right]
+            - integral[:, self.bottom, self.left]
+            + integral[:, self.top, self.left]
+        )
+        return sums.astype(np.float32) / self.num_cells
+
+def load_training(testcase: str) -> Dict[int, int]:
+    """
+    Returns the ground truth score at each labeled frame from the test case's train.txt, or an empty dict if the
+    test case has no train.txt.
+    """
+
+    training_path = f"{TEST_CASE_DIRECTORY}/{testcase}/train.txt"
+    if not os.path.exists(training_path):
+        return {}
+
+    training = {}
+    with open(training_path, "r") as file:
+        for line in file:
+            if line.strip():
+                frame, score = line.split()
+                training[int(frame)] = int(score)
+    return training
+
+def extract_testcase(testcase: str, threshold: int = 100) -> Dict[str, np.ndarray]:
+    """
+    Decodes every frame of the test case video and returns the digit matrices for each OCR box, keyed by box name,
+    each of shape (frames, num_digits, 14, 14).
+    """
+
+    with open(f"{OUTPUT_DIRECTORY}/{testcase}/calibration.yaml", "r") as file:
+        calibration = yaml.safe_load(file)
+
+    video = cv2.VideoCapture(find_video_file(f"{TEST_CASE_DIRECTORY}/{testcase}"))
+    if not video.isOpened():
+        raise Exception("Could not open video file")
+
+    width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    extractors = {
+        name: DigitMatrixExtractor(calibration["rects"][name], num_digits, width, height, threshold)
+        for name, num_digits in NUMBER_OCR_BOXES.items()
+    }
+    matrices: Dict[str, List[np.ndarray]] = {name: [] for name in extractors}
+    crops: Dict[str, List[np.ndarray]] = {name: [] for name in extractors}
+
+    def flush():
+        for name, extractor in extractors.items():
+            if crops[name]:
+                matrices[name].append(extractor.extract(np.stack(crops[name])))
+                crops[name].clear()
+
+    # Decode sequentially, which is far cheaper than seeking to each frame
+    while True:
+        ret, frame = video.read()
+        if not ret:
+            break
+
+        for name, extractor in extractors.items():
+            crops[name].append(extractor.crop(frame))
+
+        if len(crops["score"]) == CHUNK_SIZE:
+            flush()
+
+    flush()
+    video.release()
+
+    return {
+        name: np.concatenate(matrices[name]) if matrices[name]
+        else np.zeros((0, NUMBER_OCR_BOXES[name], NUMBER_PIXEL_SIZE, NUMBER_PIXEL_SIZE), dtype=np.float32)
+        for name in extractors
+    }
+
+def load_classifier():
+    """
+    Loads the digit classifier from the TensorFlow.js model used by the TypeScript OCR.
+    """
+    import tensorflowjs as tfjs
+    return tfjs.converters.load_keras_model(MODEL_PATH)
+
+def classify(model, matrices: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """
+    Classifies a stack of 14x14 digit matrices of any leading shape, and returns the probabilities of each digit
+    with shape (..., 10).
+    """
+    flat = matrices.reshape(-1, NUMBER_PIXEL_SIZE, NUMBER_PIXEL_SIZE, 1)
+    if flat.shape[0] == 0:
+        return np.zeros(matrices.shape[:-2] + (10,), dtype=np.float32)
+    probabilities = model.predict(flat, batch_size=batch_size, verbose=0)
+    return probabilities.reshape(matrices.shape[:-2] + (10,))
+
+def digits_to_number(digits: np.ndarray, confidences: np.ndarray) -> np.ndarray:
+    """
+    Combines the predicted digits of shape (frames, num_digits) into one number per frame. If any digit is below
+    the minimum confidence, the number is -1, as in OCRFrame.predictDigits.
+    """
+    place_values = 10 ** np.arange(digits.shape[1] - 1, -1, -1)
+    numbers = digits @ place_values
+    numbers[(confidences < MINIMUM_CONFIDENCE).any(axis=1)] = -1
+    return numbers
+
+def confusion_matrix(testcase: str, score_digits: np.ndarray) -> np.ndarray:
+    """
+    Returns the 10x10 confusion matrix of the predicted score digits against train.txt, where rows are the
+    expected digit and columns are the predicted digit.
+    """
+
+    matrix = np.zeros((10, 10), dtype=np.int64)
+    num_digits = NUMBER_OCR_BOXES["score"]
+    for frame, score in load_training(testcase).items():
+        if frame < 0 or frame >= len(score_digits):
+            print(f"{testcase}: train.txt frame {frame} is out of range")
+            continue
+        expected = [int(digit) for digit in str(score).zfill(num_digits)]
+        np.add.at(matrix, (expected, score_digits[frame]), 1)
+    return matrix
+
+def print_confusion_matrix(title: str, matrix: np.ndarray):
+    total = matrix.sum()
+    accuracy = np.trace(matrix) / total if total else float("nan")
+    print(f"{title}: {np.trace(matrix)}/{total} digits correct ({accuracy:.2%})")
+    print("expected \\ predicted " + " ".join(f"{digit:>5}" for digit in range(10)))
+    for digit, row in enumerate(matrix):
+        print(f"{digit:>20} " + " ".join(f"{count:>5}" for count in row))
+
+def save_predictions(testcase: str, predictions: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+    """
+    Saves the per-frame predictions to test-output/<testcase>/digit-predictions.yaml
+    """
+
+    num_frames = len(predictions["score"][0])
+    numbers = {name: digits_to_number(digits, confidences) for name, (digits, confidences) in predictions.items()}
+
+    results = [
+        {
+            "frame": frame,
+            **{name: int(numbers[name][frame]) for name in predictions},
+            **{f"{name}Digits": predictions[name][0][frame].tolist() for name in predictions},
+            **{
+                f"{name}Confidences": [round(float(c), 3) for c in predictions[name][1][frame]]
+                for name in predictions
+            },
+        }
+        for frame in range(num_frames)
+    ]
+
+    with open(f"{OUTPUT_DIRECTORY}/{testcase}/digit-predictions.yaml", "w") as file:
+        yaml.dump(results, file, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper), sort_keys=False)
+
+def testcase_error(testcase: str) -> Optional[str]:
+    """
+    Returns why the test case cannot be scored, or None if it has a video and a calibration.yaml with the rects of
+    every OCR box.
+    """
+
+    if not os.path.isdir(f"{TEST_CASE_DIRECTORY}/{testcase}"):
+        return f"Test case {testcase} does not exist"
+
+    try:
+        find_video_file(f"{TEST_CASE_DIRECTORY}/{testcase}")
+    except FileNotFoundError:
+        return f"Test case {testcase} has no video"
+
+    calibration_path = f"{OUTPUT_DIRECTORY}/{testcase}/calibration.yaml"
+    if not os.path.exists(calibration_path):
+        return f"Test case {testcase} has no calibration.yaml"
+
+    with open(calibration_path, "r") as file:
+        rects = (yaml.safe_load(file) or {}).get("rects") or {}
+    missing = [name for name in NUMBER_OCR_BOXES if name not in rects]
+    if missing:
+        return f"Test case {testcase} has no {' or '.join(missing)} rect in calibration.yaml"
+
+    return None
+
+def all_testcases() -> List[str]:
+    """
+    Returns all test cases that can be scored.
+    """
+    return [
+        testcase for testcase in sorted(os.listdir(TEST_CASE_DIRECTORY))
+        if not testcase.startswith(".") and testcase_error(testcase) is None
+    ]
+
+def run(testcases: List[str], threshold: int = 100, workers: Optional[int] = None, save: bool = True):
+    if not testcases:
+        print("No test cases with a video and the score and level rects in calibration.yaml found")
+        return
+
+    start = time.perf_counter()
+
+    # Decoding and thresholding is CPU bound, so each test case is decoded in its own process
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        extracted = dict(zip(testcases, executor.map(extract_testcase, testcases, [threshold] * len(testcases))))
+    extract_time = time.perf_counter() - start
+
+    # Classify every digit of every test case in one pass so the model sees large batches
+    model = load_classifier()
+    keys = [(testcase, name) for testcase in testcases for name in NUMBER_OCR_BOXES]
+    all_matrices = np.concatenate([extracted[testcase][name].reshape(-1, NUMBER_PIXEL_SIZE, NUMBER_PIXEL_SIZE)
+                                   for testcase, name in keys])
+    classify_start = time.perf_counter()
+    all_probabilities = classify(model, all_matrices)
+    classify_time = time.perf_counter() - classify_start
+
+    total = np.zeros((10, 10), dtype=np.int64)
+    offset = 0
+    for testcase in testcases:
+        predictions = {}
+        for name in NUMBER_OCR_BOXES:
+            shape = extracted[testcase][name].shape[:2]
+            size = shape[0] * shape[1]
+            probabilities = all_probabilities[offset:offset + size].reshape(shape + (10,))
+            offset += size
+            predictions[name] = (probabilities.argmax(axis=-1), probabilities.max(axis=-1))
+
+        if save:
+            save_predictions(testcase, predictions)
+
+        num_frames = len(predictions["score"][0])
+        matrix = confusion_matrix(testcase, predictions["score"][0])
+        total += matrix
+        print_confusion_matrix(f"{testcase} ({num_frames} frames)", matrix)
+        print()
+
+    if len(testcases) > 1:
+        print_confusion_matrix("All test cases", total)
+        print()
+
+    print(f"Extracted {len(all_matrices)} digits in {extract_time:.2f}s, classified in {classify_time:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch digit OCR over whole test case videos")
+    parser.add_argument("testcases", type=str, nargs="*", help="Names of the test cases. Defaults to all test cases")
+    parser.add_argument("--threshold", type=int, default=100, help="Cutoff for a pixel to be evaluated as white")
+    parser.add_argument("--workers", type=int, default=None, help="Number of test cases to decode in parallel")
+    parser.add_argument("--no-save", action="store_true", help="Do not save the per-frame predictions")
+    args = parser.parse_args()
+
+    # Check named test cases up front, so a bad one fails here rather than in a worker process
+    for testcase in args.testcases:
+        error = testcase_error(testcase)
+        if error:
+            parser.error(error)
+
+    run(args.testcases or all_testcases(), args.threshold, args.workers, not args.no_save)
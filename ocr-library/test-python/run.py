@@ -12,7 +12,7 @@ The <testcase> argument is the name of the test case to run. The <mode> argument
 
 """
 
-import cv2, yaml, argparse, os, ipdb
+import cv2, yaml, argparse, os
 import numpy as np
 from enum import Enum
 from ocr_results import OCRResults
@@ -118,6 +118,127 @@ class StateMachineText:
         cv2.imshow(window, self.img)
 
 
+def load_calibration(testcase: str):
+    """
+    Loads calibration.yaml and calibration-plus.yaml from the test output of the test case
+    """
+
+    calibration_path = os.path.join(os.path.dirname(__file__), f"../test-output/{testcase}/calibration.yaml")
+    calibration_plus_path = os.path.join(os.path.dirname(__file__), f"../test-output/{testcase}/calibration-plus.yaml")
+
+    with (
+        open(calibration_path, "r") as calibration_file,
+        open(calibration_plus_path, "r") as calibration_plus_file
+    ):
+        return yaml.safe_load(calibration_file), yaml.safe_load(calibration_plus_file)
+
+def draw_bounds(frame, calibration: dict, calibration_plus: dict):
+    """
+    Draws all the OCR bounding rects and calibration points onto the frame
+    """
+
+    # Draw all bounding rects
+    for rect_name, rect in calibration["rects"].items():
+        x1 = rect["left"]
+        y1 = rect["top"]
+        x2 = rect["right"]
+        y2 = rect["bottom"]
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 1)
+
+    # Draw all calibration points
+    for group, points in calibration_plus["points"].items():
+        for point in points:
+            x = point["x"]
+            y = point["y"]
+            color = POINT_GROUP_COLORS[group] if group in POINT_GROUP_COLORS else BLUE
+            cv2.circle(frame, (x, y), 1, color, -1)
+
+def draw_ocr_results(frame, frame_number: int, ocr_results: OCRResults, calibration_plus: dict):
+    """
+    Draws the OCR results at the given frame onto the frame
+    """
+
+    for minoIndex, mino in enumerate(calibration_plus["points"]["board"]):
+        x, y = mino["x"], mino["y"]
+
+        # Draw mino points for CurrentBoard
+        visible = ocr_results.get_mino_at_frame(frame_number, minoIndex)
+        cv2.circle(frame, (x, y), 2, GREEN if visible else RED, -1)
+
+        # Draw mino points for StableBoard
+        visible = ocr_results.get_stable_board_mino_at_frame(frame_number, minoIndex)
+        if visible:
+            cv2.circle(frame, (x, y), 9, BLUE, 2)
+
+    for minoIndex, mino in enumerate(calibration_plus["points"]["next"]):
+        x, y = mino["x"], mino["y"]
+        color = GREEN if ocr_results.get_next_grid_point_at_frame(frame_number, minoIndex) else RED
+        cv2.circle(frame, (x, y), 2, color, -1)
+
+def render_state_machine(frame_number: int, ocr_results: OCRResults) -> StateMachineText:
+    """
+    Renders the state machine viewer for the given frame
+    """
+
+    state_machine_text = StateMachineText()
+    state_machine_text.add_text(f"Frame: {frame_number}")
+
+    state_name = ocr_results.get_state_at_frame(frame_number)
+    state_count = ocr_results.get_state_count_at_frame(frame_number)
+    state_frame_count = ocr_results.get_relative_state_frame_count_at_frame(frame_number)
+    state_machine_text.add_text(f"[{state_count}] State: {state_name} ({state_frame_count})")
+
+    state_machine_text.new_line()
+    state_machine_text.add_text("OCR:")
+    state_machine_text.add_text(f"Noise: {ocr_results.get_attribute_at_frame(frame_number, 'boardNoise')}", indent=1)
+    state_machine_text.add_text(f"Next Type: {ocr_results.get_attribute_at_frame(frame_number, 'nextType')}", indent=1)
+    state_machine_text.add_text(f"Level: {ocr_results.get_attribute_at_frame(frame_number, 'level')}", indent=1)
+    state_machine_text.add_text(f"Score: {ocr_results.get_attribute_at_frame(frame_number, 'score')}", indent=1)
+    state_machine_text.add_text(f"Only tetromino on board: {ocr_results.get_board_only_type_at_frame(frame_number)}", indent=1)
+    state_machine_text.add_text(f"Lines sent: {ocr_results.get_attribute_at_frame(frame_number, 'gameLinesSent')}", indent=1)
+
+    # predictions = ocr_results.get_attribute_at_frame(frame_number, 'levelPrediction')
+    # try:
+    #     for prediction in predictions:
+    #         for i in range(len(prediction["probabilities"])):
+    #             prediction["probabilities"][i] = round(prediction["probabilities"][i], 2)
+    #     state_machine_text.new_line()
+    #     state_machine_text.add_text(f"{predictions[0]["digit"]} {predictions[0]["probability"]}", indent=1)
+    #     state_machine_text.add_text(f"{predictions[0]["probabilities"]}", indent=1)
+    #     state_machine_text.new_line()
+    #     state_machine_text.add_text(f"{predictions[1]["digit"]} {predictions[1]["probability"]}", indent=1)
+    #     state_machine_text.add_text(f"{predictions[1]["probabilities"]}", indent=1)
+    # except:
+    #     pass
+
+    state_machine_text.new_line()
+    state_machine_text.add_text("Game state:")
+    state_machine_text.add_text(f"Current type: {ocr_results.get_attribute_at_frame(frame_number, 'gameCurrentType')}", indent=1)
+    state_machine_text.add_text(f"Next type: {ocr_results.get_attribute_at_frame(frame_number, 'gameNextType')}", indent=1)
+    state_machine_text.add_text(f"Score: {ocr_results.get_attribute_at_frame(frame_number, 'gameScore')}", indent=1)
+    state_machine_text.add_text(f"Lines: {ocr_results.get_attribute_at_frame(frame_number, 'gameLines')}", indent=1)
+    state_machine_text.add_text(f"Level: {ocr_results.get_attribute_at_frame(frame_number, 'gameLevel')}", indent=1)
+
+    state_machine_text.new_line()
+    state_machine_text.add_text("Event Statuses:")
+    for event_status in ocr_results.get_event_statuses_at_frame(frame_number):
+        state_machine_text.add_text(f"{event_status.name}:")
+        state_machine_text.add_text(f"Precondition met: {event_status.precondition_met}", indent=1)
+        state_machine_text.add_text(f"Persistence met: {event_status.persistence_met}", indent=1)
+
+    state_machine_text.new_line()
+    state_machine_text.add_text("Packets:")
+    for packet in ocr_results.get_packets_at_frame(frame_number):
+        state_machine_text.add_text(packet, indent=1)
+
+    state_machine_text.new_line()
+    state_machine_text.add_text("Logs:")
+    for log in ocr_results.get_logs_at_frame(frame_number):
+        state_machine_text.add_text(log, indent=1)
+
+    return state_machine_text
+
+
 def update_frame_position(val):
     global frame_number
     frame_number = val
@@ -172,113 +293,19 @@ def play_video(testcase: str, mode: Mode):
         
         # if in bounds, add bounding rect to each frame
         if mode == Mode.BOUNDS:
-            calibration_path = os.path.join(os.path.dirname(__file__), f"../test-output/{testcase}/calibration.yaml")
-            calibration_plus_path = os.path.join(os.path.dirname(__file__), f"../test-output/{testcase}/calibration-plus.yaml")
-
-            with (
-                open(calibration_path, "r") as calibration_file,
-                open(calibration_plus_path, "r") as calibration_plus_file
-            ):
-                calibration = yaml.safe_load(calibration_file)
-                calibration_plus = yaml.safe_load(calibration_plus_file)
-
-                # Draw all bounding rects
-                for rect_name, rect in calibration["rects"].items():
-                    x1 = rect["left"]
-                    y1 = rect["top"]
-                    x2 = rect["right"]
-                    y2 = rect["bottom"]
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 1)
-
-                # Draw all calibration points
-                for group, points in calibration_plus["points"].items():
-                    for point in points:
-                        x = point["x"]
-                        y = point["y"]
-                        color = POINT_GROUP_COLORS[group] if group in POINT_GROUP_COLORS else BLUE
-                        cv2.circle(frame, (x, y), 1, color, -1)
+            calibration, calibration_plus = load_calibration(testcase)
+            draw_bounds(frame, calibration, calibration_plus)
 
         # if output, draw the OCR results on the frame
         if ocr_results and mode == Mode.OUTPUT:
-            for minoIndex, mino in enumerate(calibration_plus["points"]["board"]):
-                x, y = mino["x"], mino["y"]
-
-                # Draw mino points for CurrentBoard
-                visible = ocr_results.get_mino_at_frame(frame_number, minoIndex)
-                cv2.circle(frame, (x, y), 2, GREEN if visible else RED, -1)
-
-                # Draw mino points for StableBoard
-                visible = ocr_results.get_stable_board_mino_at_frame(frame_number, minoIndex)
-                if visible:
-                    cv2.circle(frame, (x, y), 9, BLUE, 2)
-
-            for minoIndex, mino in enumerate(calibration_plus["points"]["next"]):
-                x, y = mino["x"], mino["y"]
-                color = GREEN if ocr_results.get_next_grid_point_at_frame(frame_number, minoIndex) else RED
-                cv2.circle(frame, (x, y), 2, color, -1)
+            draw_ocr_results(frame, frame_number, ocr_results, calibration_plus)
 
         # Display the current frame
         cv2.imshow(WINDOW, frame)
 
         # Display the state machine viewer
         if ocr_results and mode == Mode.OUTPUT:
-            state_machine_text = StateMachineText()
-            state_machine_text.add_text(f"Frame: {frame_number}")
-
-            state_name = ocr_results.get_state_at_frame(frame_number)
-            state_count = ocr_results.get_state_count_at_frame(frame_number)
-            state_frame_count = ocr_results.get_relative_state_frame_count_at_frame(frame_number)
-            state_machine_text.add_text(f"[{state_count}] State: {state_name} ({state_frame_count})")
-
-            state_machine_text.new_line()
-            state_machine_text.add_text("OCR:")
-            state_machine_text.add_text(f"Noise: {ocr_results.get_attribute_at_frame(frame_number, 'boardNoise')}", indent=1)
-            state_machine_text.add_text(f"Next Type: {ocr_results.get_attribute_at_frame(frame_number, 'nextType')}", indent=1)
-            state_machine_text.add_text(f"Level: {ocr_results.get_attribute_at_frame(frame_number, 'level')}", indent=1)
-            state_machine_text.add_text(f"Score: {ocr_results.get_attribute_at_frame(frame_number, 'score')}", indent=1)
-            state_machine_text.add_text(f"Only tetromino on board: {ocr_results.get_board_only_type_at_frame(frame_number)}", indent=1)
-            state_machine_text.add_text(f"Lines sent: {ocr_results.get_attribute_at_frame(frame_number, 'gameLinesSent')}", indent=1)
-
-            # predictions = ocr_results.get_attribute_at_frame(frame_number, 'levelPrediction')
-            # try:
-            #     for prediction in predictions:
-            #         for i in range(len(prediction["probabilities"])):
-            #             prediction["probabilities"][i] = round(prediction["probabilities"][i], 2)
-            #     state_machine_text.new_line()
-            #     state_machine_text.add_text(f"{predictions[0]["digit"]} {predictions[0]["probability"]}", indent=1)
-            #     state_machine_text.add_text(f"{predictions[0]["probabilities"]}", indent=1)
-            #     state_machine_text.new_line()
-            #     state_machine_text.add_text(f"{predictions[1]["digit"]} {predictions[1]["probability"]}", indent=1)
-            #     state_machine_text.add_text(f"{predictions[1]["probabilities"]}", indent=1)
-            # except:
-            #     pass
-
-            state_machine_text.new_line()
-            state_machine_text.add_text("Game state:")
-            state_machine_text.add_text(f"Current type: {ocr_results.get_attribute_at_frame(frame_number, 'gameCurrentType')}", indent=1)
-            state_machine_text.add_text(f"Next type: {ocr_results.get_attribute_at_frame(frame_number, 'gameNextType')}", indent=1)
-            state_machine_text.add_text(f"Score: {ocr_results.get_attribute_at_frame(frame_number, 'gameScore')}", indent=1)
-            state_machine_text.add_text(f"Lines: {ocr_results.get_attribute_at_frame(frame_number, 'gameLines')}", indent=1)
-            state_machine_text.add_text(f"Level: {ocr_results.get_attribute_at_frame(frame_number, 'gameLevel')}", indent=1)
-
-            state_machine_text.new_line()
-            state_machine_text.add_text("Event Statuses:")
-            for event_status in ocr_results.get_event_statuses_at_frame(frame_number):
-                state_machine_text.add_text(f"{event_status.name}:")
-                state_machine_text.add_text(f"Precondition met: {event_status.precondition_met}", indent=1)
-                state_machine_text.add_text(f"Persistence met: {event_status.persistence_met}", indent=1)
-
-            state_machine_text.new_line()
-            state_machine_text.add_text("Packets:")
-            for packet in ocr_results.get_packets_at_frame(frame_number):
-                state_machine_text.add_text(packet, indent=1)
-
-            state_machine_text.new_line()
-            state_machine_text.add_text("Logs:")
-            for log in ocr_results.get_logs_at_frame(frame_number):
-                state_machine_text.add_text(log, indent=1)
-
-            state_machine_text.show(OUTPUT_WINDOW)
+            render_state_machine(frame_number, ocr_results).show(OUTPUT_WINDOW)
 
         key = cv2.waitKey(10)
 
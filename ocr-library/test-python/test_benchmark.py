@@ -0,0 +1,99 @@
+import argparse
+import pytest
+import benchmark
+from benchmark import compare, find_baseline, is_benchmarked, parse_threshold, positive_int
+
+def baselines(**timestamps: str) -> dict:
+    return {commit: {"timestamp": timestamp, "metrics": {}} for commit, timestamp in timestamps.items()}
+
+@pytest.fixture
+def saved(monkeypatch):
+    """
+    Replaces the saved baselines of every machine with the given dict.
+    """
+    def save(entries: dict):
+        monkeypatch.setattr(benchmark, "load_baselines", lambda machine: entries)
+    return save
+
+def test_find_baseline_defaults_to_head(saved):
+    saved(baselines(old="2026-01-01T00:00:00", head="2026-01-02T00:00:00", newer="2026-01-03T00:00:00"))
+    assert find_baseline("machine", "head", None)["commit"] == "head"
+    assert find_baseline("machine", "head-dirty", None)["commit"] == "head"
+
+def test_find_baseline_falls_back_to_latest_commit(saved):
+    saved(baselines(old="2026-01-01T00:00:00", older="2025-01-01T00:00:00", mine="2027-01-01T00:00:00"))
+    assert find_baseline("machine", "new", None)["commit"] == "mine"
+    assert find_baseline("machine", "mine-dirty", None)["commit"] == "mine"
+
+    saved(baselines(**{"old": "2026-01-01T00:00:00", "head-dirty": "2026-01-02T00:00:00"}))
+    assert find_baseline("machine", "head-dirty", None)["commit"] == "head-dirty"
+
+    saved({})
+    assert find_baseline("machine", "head", None) is None
+
+def test_find_baseline_requested_commit(saved):
+    saved(baselines(old="2026-01-01T00:00:00", head="2026-01-02T00:00:00"))
+    assert find_baseline("machine", "head", "old")["commit"] == "old"
+    with pytest.raises(ValueError):
+        find_baseline("machine", "head", "missing")
+
+def test_compare_direction():
+    baseline = {"video_server.random_fps": 100.0, "render.bounds_ms_per_frame": 10.0}
+
+    # Lower fps and higher times are worse
+    assert compare({"video_server.random_fps": 80.0, "render.bounds_ms_per_frame": 12.0}, baseline, {}, 0.1,
+                   [], False) == ["render.bounds_ms_per_frame", "video_server.random_fps"]
+
+    # Higher fps and lower times are better
+    assert compare({"video_server.random_fps": 200.0, "render.bounds_ms_per_frame": 5.0}, baseline, {}, 0.1,
+                   [], False) == []
+
+    # Changes within the threshold are not regressions
+    assert compare({"video_server.random_fps": 95.0, "render.bounds_ms_per_frame": 10.5}, baseline, {}, 0.1,
+                   [], False) == []
+
+def test_compare_threshold_lookup_order():
+    metric = "Case1/video_server.random_fps"
+    baseline = {metric: 100.0}
+    metrics = {metric: 70.0}
+
+    assert compare(metrics, baseline, {}, 0.1, ["Case1"], False) == [metric]
+    assert compare(metrics, baseline, {"video_server": 0.5}, 0.1, ["Case1"], False) == []
+
+    # The name without the test case overrides the group, and the full name overrides both
+    assert compare(metrics, baseline, {"video_server": 0.5, "video_server.random_fps": 0.1}, 0.1,
+                   ["Case1"], False) == [metric]
+    assert compare(metrics, baseline, {"video_server.random_fps": 0.1, metric: 0.5}, 0.1, ["Case1"], False) == []
+
+def test_compare_missing_and_skipped_metrics():
+    baseline = {
+        "Case1/render.output_ms_per_frame": 5.0,
+        "Case2/video_server.random_fps": 3.0,
+        "classifier.batch_digits_per_sec": 1e5,
+    }
+
+    # Missing from a benchmarked test case fails, metrics of test cases and the classifier not run are skipped
+    assert compare({}, baseline, {}, 0.1, ["Case1"], False) == ["Case1/render.output_ms_per_frame"]
+    assert compare({}, baseline, {}, 0.1, ["Case1", "Case2"], True) == sorted(baseline)
+
+    # New metrics without a baseline are not regressions
+    assert compare({"Case1/render.bounds_ms_per_frame": 1.0}, {}, {}, 0.1, ["Case1"], True) == []
+
+def test_is_benchmarked():
+    assert is_benchmarked("Case1/video_server.random_fps", ["Case1"], False)
+    assert not is_benchmarked("Case2/video_server.random_fps", ["Case1"], True)
+    assert is_benchmarked("classifier.batch_digits_per_sec", [], True)
+    assert not is_benchmarked("classifier.batch_digits_per_sec", [], False)
+
+def test_parse_threshold():
+    assert parse_threshold("video_server=0.25") == ("video_server", 0.25)
+    assert parse_threshold("Case1/video_server.random_fps=1") == ("Case1/video_server.random_fps", 1.0)
+    for value in ("video_server0.25", "=0.25", "video_server=", "video_server=fast"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_threshold(value)
+
+def test_positive_int():
+    assert positive_int("5") == 5
+    for value in ("0", "-1", "five"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            positive_int(value)
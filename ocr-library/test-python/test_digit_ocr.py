@@ -0,0 +1,73 @@
+import numpy as np
+from digit_ocr import DigitMatrixExtractor, NUMBER_PIXEL_SIZE, MINIMUM_CONFIDENCE, js_round, digits_to_number
+
+def js_round_scalar(value: float) -> int:
+    return int(np.floor(value + 0.5))
+
+def naive_digit_matrix(frame: np.ndarray, rect: dict, num_digits: int, digit: int, threshold: int, offset: dict):
+    """
+    Direct port of NumberOCRBox.getDigitMatrix, one pixel at a time.
+    """
+
+    height, width, _ = frame.shape
+    digit_rect = {
+        "top": js_round_scalar(rect["top"]) + offset["top"],
+        "left": js_round_scalar(rect["left"] + digit / num_digits * (rect["right"] - rect["left"])) + offset["left"],
+        "bottom": js_round_scalar(rect["bottom"]) + offset["bottom"],
+        "right": js_round_scalar(rect["left"] + (digit + 1) / num_digits * (rect["right"] - rect["left"])) + offset["right"],
+    }
+
+    def scale(value, low, high):
+        return js_round_scalar(low + value * (high - low))
+
+    matrix = np.zeros((NUMBER_PIXEL_SIZE, NUMBER_PIXEL_SIZE))
+    for y in range(NUMBER_PIXEL_SIZE):
+        for x in range(NUMBER_PIXEL_SIZE):
+            tl_x = scale(x / NUMBER_PIXEL_SIZE, digit_rect["left"], digit_rect["right"])
+            tl_y = scale(y / NUMBER_PIXEL_SIZE, digit_rect["top"], digit_rect["bottom"])
+            br_x = scale((x + 1) / NUMBER_PIXEL_SIZE, digit_rect["left"], digit_rect["right"])
+            br_y = scale((y + 1) / NUMBER_PIXEL_SIZE, digit_rect["top"], digit_rect["bottom"])
+
+            total = 0
+            for py in range(tl_y, br_y + 1):
+                for px in range(tl_x, br_x + 1):
+                    # Pixels outside the frame count as black
+                    if 0 <= px < width and 0 <= py < height:
+                        total += int(frame[py, px].sum()) / 3 > threshold
+            matrix[y, x] = total / ((br_y - tl_y + 1) * (br_x - tl_x + 1))
+    return matrix
+
+def test_extract_matches_get_digit_matrix():
+    rng = np.random.default_rng(0)
+    width, height = 120, 90
+    frames = rng.integers(0, 256, (2, height, width, 3), dtype=np.uint8)
+
+    for _ in range(30):
+        num_digits = int(rng.integers(1, 7))
+        # Rects may extend past any edge of the frame
+        left, top = int(rng.integers(-30, width)), int(rng.integers(-30, height))
+        rect = {
+            "left": left,
+            "top": top,
+            "right": left + int(rng.integers(num_digits, 80)),
+            "bottom": top + int(rng.integers(1, 40)),
+        }
+        offset = {side: int(rng.integers(-2, 3)) for side in ("top", "left", "bottom", "right")}
+        threshold = int(rng.integers(50, 200))
+
+        extractor = DigitMatrixExtractor(rect, num_digits, width, height, threshold, offset)
+        matrices = extractor.extract(np.stack([extractor.crop(frame) for frame in frames]))
+
+        for i, frame in enumerate(frames):
+            for digit in range(num_digits):
+                expected = naive_digit_matrix(frame, rect, num_digits, digit, threshold, offset)
+                assert np.allclose(matrices[i, digit], expected), (rect, offset, threshold, digit)
+
+def test_js_round_rounds_halves_up():
+    values = np.array([0.5, 1.5, 2.5, -0.5, -1.5, 2.4999])
+    assert js_round(values).tolist() == [1, 2, 3, 0, -1, 2]
+
+def test_digits_to_number():
+    digits = np.array([[0, 0, 3, 0, 0, 0], [1, 2, 3, 4, 5, 6]])
+    confidences = np.array([[1.0] * 6, [1.0] * 5 + [MINIMUM_CONFIDENCE - 0.01]])
+    assert digits_to_number(digits, confidences).tolist() == [3000, -1]